@@ -1,12 +1,17 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import logging
-from typing import List, Dict
+import asyncio
+import functools
+from typing import List, Dict, Literal
 from urllib.parse import urljoin
-import json
+import orjson
+import msgspec
+import msgpack
 import re
 import os
 
@@ -15,7 +20,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
-app = FastAPI(title="Watch Collection API", version="1.0.0")
+app = FastAPI(title="Watch Collection API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -39,28 +44,71 @@ class ProductDetails(BaseModel):
 class WatchQuery(BaseModel):
     name: str
 
+# Slug translation table: drop ASCII punctuation, turn ASCII whitespace into dashes
+_SLUG_TABLE = str.maketrans({
+    c: '-' if c.isspace() else None
+    for c in map(chr, range(128))
+    if not (c.isalnum() or c in '_-')
+})
+
+# Precompiled patterns for slug and filename generation
+_SLUG_DASH = re.compile(r'-+')
+_SAFE_STRIP = re.compile(r'[^\w\s-]')
+# Matches the <img> tags of the bundled sample HTML; only valid for that trusted, fixed markup
+_IMG_RE = re.compile(r'<img src="([^"]+)" alt="([^"]+)"')
+
+# Output directory for saved product data, created once at startup
+os.makedirs('data', exist_ok=True)
+
 # Storage utility functions
 def generate_slug(name: str) -> str:
     """Generate a URL-friendly slug from the product name."""
     if not name:
         return ''
-    slug = re.sub(r'[^\w\s-]', '', name.lower()).strip()
-    slug = re.sub(r'[\s-]+', '-', slug)
+    slug = _SLUG_DASH.sub('-', name.lower().translate(_SLUG_TABLE))
     return slug.strip('-')
 
+@functools.lru_cache(maxsize=256)
 def generate_safe_filename(name: str, category: str) -> str:
     """Generate a safe filename for saving product data."""
-    safe_name = re.sub(r'[^\w\s-]', '', name).replace(' ', '_').lower()
-    filename = f"data/{safe_name}_{category}.json"
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    return filename
+    safe_name = _SAFE_STRIP.sub('', name).replace(' ', '_').lower()
+    return f"data/{safe_name}_{category}.json"
 
 def save_data(data: Product | ProductDetails, filename: str):
     """Save product or product collection data to a JSON file."""
     try:
-        serialized_data = data.model_dump(exclude_none=True)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(serialized_data, f, indent=4)
+        payload = orjson.dumps(data.model_dump(exclude_none=True), option=orjson.OPT_INDENT_2)
+        with open(filename, 'wb') as f:
+            f.write(payload)
+        logger.info(f"Data saved to {filename}")
+    except Exception as e:
+        logger.error(f"Error saving data to {filename}: {e}")
+        raise
+
+def save_data_ndjson(data: ProductDetails, filename: str):
+    """Save a product collection to a single NDJSON file, one product per line."""
+    try:
+        payload = b''.join(orjson.dumps(product.model_dump(exclude_none=True)) + b'\n' for product in data.products)
+        with open(filename, 'wb') as f:
+            f.write(payload)
+        logger.info(f"Data saved to {filename}")
+    except Exception as e:
+        logger.error(f"Error saving data to {filename}: {e}")
+        raise
+
+def save_data_msgpack(data: Product | ProductDetails, filename: str):
+    """Save product or product collection data to a msgpack file, writing collections one product at a time."""
+    try:
+        packer = msgpack.Packer()
+        with open(filename, 'wb') as f:
+            if isinstance(data, ProductDetails):
+                f.write(packer.pack_map_header(1))
+                f.write(packer.pack('products'))
+                f.write(packer.pack_array_header(len(data.products)))
+                for product in data.products:
+                    f.write(packer.pack(product.model_dump(exclude_none=True)))
+            else:
+                f.write(packer.pack(data.model_dump(exclude_none=True)))
         logger.info(f"Data saved to {filename}")
     except Exception as e:
         logger.error(f"Error saving data to {filename}: {e}")
@@ -107,27 +155,43 @@ watch_links = [
     'https://www.shopar.ai/collection/watches?product=66ba071914de953c8000722f&mode=3d'
 ]
 
+# Function to find (src, alt) pairs for each watch item
+def find_watch_images(html: str, trusted: bool = False) -> List[tuple | None] | None:
+    """Return (src, alt) per watch item, None for items without an image, or None if the container is missing."""
+    if trusted:
+        # Fixed markup: a regex avoids building a DOM at all
+        return _IMG_RE.findall(html)
+
+    tree = LexborHTMLParser(html)
+    watch_container = tree.css_first(r'div.flex.space-x-4.min-h-\[60px\]')
+    if not watch_container:
+        return None
+
+    images = []
+    for item in watch_container.css('div.inline-block'):
+        img_tag = item.css_first('img')
+        images.append((img_tag.attributes.get('src'), img_tag.attributes.get('alt')) if img_tag else None)
+    return images
+
 # Function to extract watch data
-def extract_watch_data(html: str, links: List[str]) -> List[Dict]:
+def extract_watch_data(html: str, links: List[str], trusted: bool = False) -> List[Dict]:
     try:
-        soup = BeautifulSoup(html, 'html.parser')
         watches = []
-        watch_container = soup.find('div', class_='flex space-x-4 min-h-[60px]')
-        if not watch_container:
+        watch_items = find_watch_images(html, trusted)
+        if watch_items is None:
             logger.error("Watch container not found in HTML")
             return []
 
-        watch_items = watch_container.find_all('div', class_='inline-block')
-        logger.info(f"Found {len(watch_items)} watch items in HTML")
+        logger.debug(f"Found {len(watch_items)} watch items in HTML")
 
         if len(watch_items) != len(links):
             logger.warning(f"Mismatch: {len(watch_items)} watch items found, but {len(links)} links provided")
 
         for i, item in enumerate(watch_items):
-            img_tag = item.find('img')
-            if img_tag and i < len(links):
-                name = img_tag.get('alt', 'Unknown Watch').strip()
-                img_url = img_tag.get('src', '').strip()
+            if item and i < len(links):
+                src, alt = item
+                name = (alt or 'Unknown Watch').strip()
+                img_url = (src or '').strip()
                 if img_url and not img_url.startswith('http'):
                     img_url = urljoin('https://www.shopar.ai', img_url)
                 if not img_url:
@@ -144,50 +208,87 @@ def extract_watch_data(html: str, links: List[str]) -> List[Dict]:
             else:
                 logger.warning(f"Skipping watch item {i}: No image or insufficient links")
 
-        logger.info(f"Successfully extracted {len(watches)} watches")
+        logger.debug(f"Successfully extracted {len(watches)} watches")
         return watches
     except Exception as e:
         logger.error(f"Error extracting watch data: {str(e)}")
         return []
 
+# Parse the static HTML once at startup; both inputs are module-level constants
+_WATCHES_CACHE = extract_watch_data(html_content, watch_links, trusted=True)
+# Build the models once and share them across all endpoints; validation is skipped
+# because extract_watch_data controls the shape of every dict
+_PRODUCT_DETAILS = ProductDetails.model_construct(products=[Product.model_construct(**watch) for watch in _WATCHES_CACHE])
+_WATCHES_BY_NAME = {product.name.strip().lower(): product for product in _PRODUCT_DETAILS.products}
+# The collection never changes, so its JSON body is serialized once as well
+_WATCHES_JSON_BYTES = orjson.dumps(_PRODUCT_DETAILS.model_dump(exclude_none=True))
+
 # API endpoints
-@app.get("/watches", response_model=ProductDetails)
+# Cached models are returned without response_model, so FastAPI does not re-validate them;
+# the documented schema is only kept via responses= and clients must trust the server-side models
+@app.get("/watches", responses={200: {"model": ProductDetails}})
 async def get_watch_collection():
-    watches = extract_watch_data(html_content, watch_links)
-    if not watches:
+    if not _WATCHES_CACHE:
         raise HTTPException(status_code=500, detail="Failed to process watch collection")
-    return ProductDetails(products=[Product(**watch) for watch in watches])
+    return Response(content=_WATCHES_JSON_BYTES, media_type='application/json')
 
-@app.post("/watches/by-name", response_model=Product)
+@app.post("/watches/by-name", responses={200: {"model": Product}})
 async def get_watch_by_name(query: WatchQuery):
-    watches = extract_watch_data(html_content, watch_links)
-    if not watches:
+    if not _WATCHES_CACHE:
         raise HTTPException(status_code=500, detail="Failed to process watch collection")
     
-    watch_name = query.name.strip().lower()
-    for watch in watches:
-        if watch['name'].lower().strip() == watch_name:
-            return Product(**watch)
-    raise HTTPException(status_code=404, detail=f"Watch '{query.name}' not found")
+    product = _WATCHES_BY_NAME.get(query.name.strip().lower())
+    if product is None:
+        raise HTTPException(status_code=404, detail=f"Watch '{query.name}' not found")
+    return ORJSONResponse(content=product.model_dump(exclude_none=True))
 
 @app.post("/watches/save", response_model=dict)
-async def save_watch_collection():
-    watches = extract_watch_data(html_content, watch_links)
-    if not watches:
+async def save_watch_collection(request: Request, mode: Literal["files", "combined"] = "files"):
+    if not _WATCHES_CACHE:
         raise HTTPException(status_code=500, detail="Failed to process watch collection")
     
+    if mode == "combined":
+        # One file for the whole collection instead of one open/write/close per watch
+        combined_filename = "data/watches.ndjson"
+        await asyncio.to_thread(save_data_ndjson, _PRODUCT_DETAILS, combined_filename)
+        if 'application/msgpack' in request.headers.get('accept', ''):
+            return Response(
+                content=msgspec.msgpack.encode({'collection': combined_filename, 'files': []}),
+                media_type='application/msgpack',
+            )
+        return {"message": f"Watch collection saved to {combined_filename}"}
+    
     collection_filename = generate_safe_filename("watch_collection", "watches")
-    save_data(ProductDetails(products=[Product(**watch) for watch in watches]), collection_filename)
+    pairs = [(_PRODUCT_DETAILS, collection_filename)]
     
     saved_files = []
-    for watch in watches:
-        filename = generate_safe_filename(watch['name'], "watch")
-        save_data(Product(**watch), filename)
+    for product in _PRODUCT_DETAILS.products:
+        filename = generate_safe_filename(product.name, "watch")
+        pairs.append((product, filename))
         saved_files.append(filename)
     
+    # Run the blocking writes in worker threads so they overlap and don't stall the event loop
+    await asyncio.gather(*(asyncio.to_thread(save_data, data, filename) for data, filename in pairs))
+    
+    # Internal consumers can ask for a compact msgpack payload instead of the JSON message
+    if 'application/msgpack' in request.headers.get('accept', ''):
+        return Response(
+            content=msgspec.msgpack.encode({'collection': collection_filename, 'files': saved_files}),
+            media_type='application/msgpack',
+        )
+    
     return {"message": f"Watch collection saved to {collection_filename} and individual files: {', '.join(saved_files)}"}
 
 # Run the app
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import sys
+    # uvloop has no Windows support; workers require the app as an import string
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+    )
\ No newline at end of file